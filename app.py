@@ -1,16 +1,48 @@
+# NEW: Patch blocking IO first so the Gemini round-trip yields to other requests under gevent.
+from gevent import monkey
+monkey.patch_all()
+
 import os
-import json
-from flask import Flask, request, render_template_string
+import re
+import gzip
+import hashlib
+from collections import OrderedDict
+from gevent.pool import Pool
+from flask import Flask, Response, request, stream_with_context
+from flask_compress import Compress
+from markupsafe import Markup, escape
+import jinja2
+import grpc.experimental.gevent as grpc_gevent
 import google.generativeai as genai
-import markdown  # NEW: Import the markdown library
+import orjson
 
 # --- 1. Initialize & Configure ---
 app = Flask(__name__)
+# NEW: Compress dynamic HTML/JSON responses. The pre-gzipped GET page already carries Content-Encoding
+# and is left alone, and streamed SSE responses are skipped so chunks aren't held back by the compressor.
+app.config.update(
+    COMPRESS_ALGORITHM=['br', 'gzip'],
+    COMPRESS_BR_LEVEL=4,
+    COMPRESS_MIN_SIZE=500,
+    COMPRESS_MIMETYPES=['text/html', 'application/json'],
+    COMPRESS_STREAMS=False,
+)
+Compress(app)
+
+@app.before_request
+def drop_refused_encodings():
+    # Flask-Compress reads the raw header and would still pick gzip for "gzip;q=0"; pass it only the accepted codings.
+    if 'HTTP_ACCEPT_ENCODING' in request.environ:
+        accepted = [f"{coding};q={quality}" for coding, quality in request.accept_encodings if quality > 0]
+        request.environ['HTTP_ACCEPT_ENCODING'] = ", ".join(accepted)
+
+grpc_gevent.init_gevent()  # The default gRPC transport isn't covered by monkey.patch_all().
 try:
-    genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
-    model = genai.GenerativeModel('gemini-2.5-pro')
+    # Pin gRPC: one long-lived, multiplexed HTTP/2 channel per process, shared by every model.
+    genai.configure(api_key=os.environ["GOOGLE_API_KEY"], transport="grpc")
+    api_key_configured = True
 except KeyError:
-    model = None
+    api_key_configured = False
 
 # --- 2. The System Prompt (Unchanged) ---
 # MODIFIED: A much stricter system prompt based on user feedback.
@@ -48,9 +80,34 @@ Your response MUST be a valid JSON object with three keys: "ticket_draft", "clar
 }
 """
 
-# --- 3. HTML Template ---
+# --- 3. Models ---
+# NEW: SYSTEM_PROMPT is set once per model as its system instruction instead of being prepended to every prompt.
+# Gemini context caching doesn't apply: the prompt is ~600 tokens, below the cacheable minimum
+# (1024 tokens on 2.5 Flash, 4096 on 2.5 Pro), so CachedContent.create would always be rejected.
+# NEW: Short prompts go to Flash; only long ones escalate to Pro. GEMINI_ALWAYS_PRO=1 forces Pro for A/B runs.
+FLASH_MODEL_NAME = 'models/gemini-2.5-flash'
+PRO_MODEL_NAME = 'models/gemini-2.5-pro'
+PRO_PROMPT_CHARS = 4000
+ALWAYS_USE_PRO = os.environ.get("GEMINI_ALWAYS_PRO") == "1"
+# NEW: Ask Gemini for JSON directly instead of fenced markdown.
+GENERATION_CONFIG = {"response_mime_type": "application/json"}
+
+def create_model(name):
+    return genai.GenerativeModel(name, system_instruction=SYSTEM_PROMPT, generation_config=GENERATION_CONFIG)
+
+# Model name -> model; empty when no API key is configured.
+models = {}
+if api_key_configured:
+    models = {name: create_model(name) for name in (FLASH_MODEL_NAME, PRO_MODEL_NAME)}
+
+def pick_model_name(prompt_chars):
+    use_pro = ALWAYS_USE_PRO or prompt_chars > PRO_PROMPT_CHARS
+    return PRO_MODEL_NAME if use_pro else FLASH_MODEL_NAME
+
+# --- 4. HTML Template ---
 # MODIFIED: Major changes to layout, styling, and forms.
-HTML_TEMPLATE = """
+# NEW: The static <head> (mostly CSS) is a plain string; only the body goes through Jinja.
+HEAD_HTML = """
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -77,9 +134,13 @@ HTML_TEMPLATE = """
         /* NEW: Styles for the interactive questions */
         .ai-questions { margin-top: 30px; background-color: #f0f8ff; padding: 20px; border-radius: 5px; }
         .error { color: #de350b; font-weight: bold; }
+        .streaming { white-space: pre-wrap; font-family: inherit; color: #5e6c84; }
     </style>
 </head>
 <body>
+"""
+
+BODY_TEMPLATE = """
     <h1>📄 PRD Ticket Assistant V2</h1>
     {% if api_key_error %} <p class="error">{{ api_key_error }}</p> {% endif %}
     <div class="container">
@@ -94,19 +155,7 @@ HTML_TEMPLATE = """
                     <textarea id="context" name="context">{{ context or '' }}</textarea>
                     
                     <input type="hidden" name="previous_context" value="{{ context }}">
-                    {% for q in clarifying_questions %}
-                        <input type="hidden" name="question_{{ loop.index0 }}" value="{{ q }}">
-                    {% endfor %}
-
-                    {% if clarifying_questions %}
-                    <div class="ai-questions">
-                        <h3>2. AI's Clarifying Questions</h3>
-                        {% for q in clarifying_questions %}
-                            <label for="answer_{{ loop.index0 }}">{{ q }}</label>
-                            <input type="text" id="answer_{{ loop.index0 }}" name="answer_{{ loop.index0 }}" placeholder="Your answer here...">
-                        {% endfor %}
-                    </div>
-                    {% endif %}
+                    <div id="questions">{{ questions_html }}</div>
                     
                     <input type="submit" value="Submit & Refine">
                 </form>
@@ -114,77 +163,406 @@ HTML_TEMPLATE = """
         </div>
         <div class="preview-pane">
             <h2>Output Preview</h2>
-            <div class="sheet">
-                {% if preview_html %}
-                    {{ preview_html | safe }}
+            <div class="sheet" id="sheet">
+                {% if error %}
+                    <p class="error">Error: {{ error }}</p>
+                {% elif ticket_draft %}
+                    <pre class="streaming" id="ticket-draft">{{ ticket_draft }}</pre>
                 {% else %}
                     <p style="color: #5e6c84;">The ticket preview will appear here.</p>
                 {% endif %}
             </div>
         </div>
     </div>
+    <!-- NEW: The draft is rendered in the browser by building DOM nodes from its plain-text sections; -->
+    <!-- no third-party script runs on the page, and model output never goes through innerHTML. -->
+    <script>
+        const SECTION_TITLES = ['user story', 'context', 'acceptance criteria'];
+
+        function draftNodes(text) {
+            const nodes = [];
+            let list = null;
+            for (const rawLine of text.split('\\n')) {
+                const line = rawLine.trim();
+                if (!line) { list = null; continue; }
+                const heading = line.replace(/^#+\\s*/, '').replace(/:$/, '');
+                if (line.startsWith('#') || SECTION_TITLES.includes(heading.toLowerCase())) {
+                    list = null;
+                    const title = document.createElement('h3');
+                    title.textContent = heading;
+                    nodes.push(title);
+                } else if (/^[-*] /.test(line)) {
+                    if (!list) { list = document.createElement('ul'); nodes.push(list); }
+                    const item = document.createElement('li');
+                    item.textContent = line.slice(2);
+                    list.append(item);
+                } else {
+                    list = null;
+                    const paragraph = document.createElement('p');
+                    paragraph.textContent = line;
+                    nodes.push(paragraph);
+                }
+            }
+            return nodes;
+        }
+
+        function renderDraft(sheet, data) {
+            if (data.error) {
+                const message = document.createElement('p');
+                message.className = 'error';
+                message.textContent = 'Error: ' + data.error;
+                sheet.replaceChildren(message);
+            } else {
+                sheet.replaceChildren(...draftNodes(data.ticket_draft));
+            }
+        }
+        // The server renders the escaped draft as a <pre>; replace it with the formatted version.
+        const initialDraft = document.getElementById('ticket-draft');
+        if (initialDraft) renderDraft(document.getElementById('sheet'), { ticket_draft: initialDraft.textContent });
+
+        // Gemini streams the whole JSON object; the preview shows only the ticket_draft string written so far.
+        const JSON_ESCAPES = { n: '\\n', t: '\\t', r: '\\r', b: '\\b', f: '\\f' };
+
+        function partialDraft(json) {
+            const key = json.match(/"ticket_draft"\\s*:\\s*"/);
+            if (!key) return '';
+            let text = '';
+            for (let i = key.index + key[0].length; i < json.length; i++) {
+                const ch = json[i];
+                if (ch === '"') break;
+                if (ch !== '\\\\') { text += ch; continue; }
+                // An escape split across chunks is decoded on the next call.
+                const next = json[i + 1];
+                if (next === undefined) break;
+                if (next === 'u') {
+                    const hex = json.slice(i + 2, i + 6);
+                    if (hex.length < 4) break;
+                    text += String.fromCharCode(parseInt(hex, 16));
+                    i += 5;
+                } else {
+                    text += JSON_ESCAPES[next] ?? next;
+                    i += 1;
+                }
+            }
+            return text;
+        }
+
+        // NEW: Stream the draft into the preview as Gemini writes it; falls back to a normal POST.
+        document.querySelector('form').addEventListener('submit', async (submitEvent) => {
+            const form = submitEvent.target;
+            if (!window.fetch || !window.ReadableStream || !window.TextDecoder) return;
+            submitEvent.preventDefault();
+            const button = form.querySelector("input[type='submit']");
+            let response;
+            try {
+                response = await fetch('/stream', { method: 'POST', body: new FormData(form) });
+            } catch (err) {
+                form.submit();
+                return;
+            }
+            if (!response.ok || !response.body) { form.submit(); return; }
+            button.disabled = true;
+            const sheet = document.getElementById('sheet');
+            const draft = document.createElement('pre');
+            draft.className = 'streaming';
+            sheet.replaceChildren(draft);
+            try {
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                let json = '';
+                let finished = false;
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, { stream: true });
+                    let boundary;
+                    while ((boundary = buffer.indexOf('\\n\\n')) !== -1) {
+                        const message = buffer.slice(0, boundary);
+                        buffer = buffer.slice(boundary + 2);
+                        const name = message.match(/^event: (.*)$/m)[1];
+                        const data = JSON.parse(message.match(/^data: (.*)$/m)[1]);
+                        if (name === 'chunk') {
+                            json += data;
+                            draft.textContent = partialDraft(json);
+                        } else if (name === 'done') {
+                            finished = true;
+                            renderDraft(sheet, data);
+                            document.getElementById('questions').innerHTML = data.questions_html;
+                        }
+                    }
+                }
+                if (!finished) throw new Error('the connection closed before the draft was complete');
+            } catch (err) {
+                renderDraft(sheet, { error: 'The preview stopped streaming: ' + err.message + '. Please submit again.' });
+            } finally {
+                button.disabled = false;
+            }
+        });
+    </script>
 </body>
 </html>
 """
 
-# --- 4. The AI Logic Function ---
+# NEW: Compile the template once at import; each request only runs the render step.
+# Loaded by name (not from_string) so the bytecode cache can persist the compiled body across restarts.
+app.jinja_env.bytecode_cache = jinja2.FileSystemBytecodeCache()
+app.jinja_env.loader = jinja2.ChoiceLoader([jinja2.DictLoader({"index.html": BODY_TEMPLATE}), app.jinja_env.loader])
+page_template = app.jinja_env.get_template("index.html")
+
+def render_page(**view_data):
+    return HEAD_HTML + page_template.render(**view_data)
+
+# NEW: Built in Python so both routes share it and the template needs no per-question loops.
+def render_questions(clarifying_questions, answered=()):
+    # Answered pairs ride along as hidden fields so the next turn can re-send them in its full prompt.
+    answered_html = "".join(
+        f'<input type="hidden" name="prior_question" value="{escape(q)}">'
+        f'<input type="hidden" name="prior_answer" value="{escape(a)}">'
+        for q, a in answered
+    )
+    if not clarifying_questions: return Markup(answered_html)
+    hidden_html = "".join(f'<input type="hidden" name="question" value="{escape(q)}">' for q in clarifying_questions)
+    answers_html = "".join(
+        f'<label for="answer_{i}">{escape(q)}</label>'
+        f'<input type="text" id="answer_{i}" name="answer" placeholder="Your answer here...">'
+        for i, q in enumerate(clarifying_questions)
+    )
+    return Markup(f'{answered_html}{hidden_html}<div class="ai-questions"><h3>2. AI\'s Clarifying Questions</h3>{answers_html}</div>')
+
+# --- 5. The AI Logic Function ---
+class LRUCache:
+    """A small in-process get(k)/set(k, v) cache that evicts the least recently used entry."""
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key):
+        if key not in self._data: return None
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def set(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+# Safety net in case a response still arrives wrapped in a ```json fence despite JSON mode.
+CODE_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$')
+
+# NEW: Identical prompts are answered without a Gemini call. Every turn sends its full prompt, so the
+# result depends on the prompt alone.
+analysis_cache = LRUCache(maxsize=256)
+
+def cache_key(model_name, prompt):
+    return hashlib.sha256(f"{model_name}\n{prompt}".encode()).hexdigest()
+
+def parse_analysis(text):
+    return orjson.loads(CODE_FENCE_RE.sub("", text))
+
 def get_ai_analysis(prompt):
-    if not model: return {"error": "API Key not configured."}
+    if not models: return {"error": "API Key not configured."}
+    model_name = pick_model_name(len(prompt))
+    key = cache_key(model_name, prompt)
+    cached = analysis_cache.get(key)
+    if cached is not None: return cached
     try:
-        response = model.generate_content([SYSTEM_PROMPT, prompt])
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-        return json.loads(cleaned_response)
+        analysis = parse_analysis(models[model_name].generate_content(prompt).text)
     except Exception as e:
         return {"error": f"An error occurred: {e}"}
+    analysis_cache.set(key, analysis)  # Errors are never cached, so a retry always reaches Gemini.
+    return analysis
+
+def sse_event(event, data):
+    """Formats one Server-Sent Event; data is JSON-encoded so it always fits on one line."""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
 
-# --- 5. Main App Route ---
+def stream_ai_analysis(prompt):
+    """Streaming get_ai_analysis: yields 'chunk' events as Gemini writes, then returns the analysis."""
+    model_name = pick_model_name(len(prompt))
+    key = cache_key(model_name, prompt)
+    cached = analysis_cache.get(key)
+    if cached is not None: return cached
+    try:
+        chunks = []
+        for chunk in models[model_name].generate_content(prompt, stream=True):
+            chunks.append(chunk.text)
+            yield sse_event("chunk", chunk.text)
+        analysis = parse_analysis("".join(chunks))
+    except Exception as e:
+        return {"error": f"An error occurred: {e}"}
+    analysis_cache.set(key, analysis)
+    return analysis
+
+def done_event(analysis, answered):
+    result = build_result(analysis)
+    return sse_event("done", {
+        "ticket_draft": result["ticket_draft"],
+        "error": result["error"],
+        "questions_html": render_questions(result["clarifying_questions"], answered),
+    })
+
+# NEW: Large answer sets are refined one answer per call, concurrently, then consolidated by one more call.
+PARALLEL_ANSWER_THRESHOLD = 4
+# Shared by all requests: caps concurrent fan-out sub-calls per process. Single-call turns bypass it.
+gemini_pool = Pool(10)
+TICKET_SECTIONS = ("User Story", "Context", "Acceptance Criteria")
+# Sections where each sub-call may add lines from its own answer; User Story is taken from the first draft.
+MERGED_SECTIONS = ("Context", "Acceptance Criteria")
+
+def split_sections(ticket_draft):
+    """Splits a plain-text draft into {section title: [lines]}, keyed by the titles from SYSTEM_PROMPT."""
+    sections, title = {}, ""
+    for line in ticket_draft.splitlines():
+        if line.strip() in TICKET_SECTIONS:
+            title = line.strip()
+            sections.setdefault(title, [])
+        elif line.strip():
+            sections.setdefault(title, []).append(line)
+    return sections
+
+def merge_analyses(analyses, answered_questions):
+    """Keeps User Story from the first draft and unions the Context and Acceptance Criteria of all drafts.
+
+    Each sub-call only saw its own answer, so questions answered elsewhere in the batch are dropped.
+    """
+    for analysis in analyses:
+        if "error" in analysis: return analysis
+    answered = {q.strip().casefold() for q in answered_questions}
+    sections = split_sections(analyses[0].get("ticket_draft", ""))
+    for analysis in analyses[1:]:
+        other = split_sections(analysis.get("ticket_draft", ""))
+        for title in MERGED_SECTIONS:
+            merged = sections.setdefault(title, [])
+            merged.extend(line for line in other.get(title, []) if line not in merged)
+    clarifying_questions, open_questions = [], []
+    for analysis in analyses:
+        clarifying_questions.extend(
+            q for q in analysis.get("clarifying_questions", [])
+            if q not in clarifying_questions and q.strip().casefold() not in answered
+        )
+        open_questions.extend(q for q in analysis.get("open_questions", []) if q not in open_questions)
+    ticket_draft = "\n\n".join("\n".join([title, *lines] if title else lines) for title, lines in sections.items())
+    return {"ticket_draft": ticket_draft, "clarifying_questions": clarifying_questions, "open_questions": open_questions}
+
+def build_consolidation_prompt(prompt, analyses):
+    drafts_text = "".join(f"\n\nDraft {i}:\n{a.get('ticket_draft', '')}" for i, a in enumerate(analyses, 1))
+    return (prompt + "\n\n--- Drafts to Consolidate ---\n"
+            "Each draft below integrated one of the answers above. Combine them into one ticket that keeps "
+            "every fact from every draft." + drafts_text)
+
+def get_parallel_analysis(prompt, sub_prompts, answers):
+    """Fans sub_prompts out, then asks Gemini once to consolidate the drafts against the full prompt.
+
+    The line-level merge_analyses result is the fallback when the consolidation call fails.
+    """
+    answered_questions = [question for question, _ in answers]
+    analyses = gemini_pool.map(get_ai_analysis, sub_prompts)
+    merged = merge_analyses(analyses, answered_questions)
+    if "error" in merged: return merged
+    consolidated = get_ai_analysis(build_consolidation_prompt(prompt, analyses))
+    if "error" in consolidated: return merged
+    return merge_analyses([consolidated], answered_questions)
+
+# NEW: Each turn sends the full prompt: story, context and every answer given so far. Earlier answers come
+# back from the browser as hidden fields, so any gunicorn worker can serve any turn and no state is kept here.
+def get_refined_analysis(user_story, context, prior_answers, answers):
+    prompt = build_prompt(user_story, context, [*prior_answers, *answers])
+    if len(answers) >= PARALLEL_ANSWER_THRESHOLD:
+        # Each sub-call sees every earlier answer plus one of this turn's.
+        sub_prompts = [build_prompt(user_story, context, [*prior_answers, answer]) for answer in answers]
+        return get_parallel_analysis(prompt, sub_prompts, answers)
+    return get_ai_analysis(prompt)
+
+def stream_refined_analysis(user_story, context, prior_answers, answers):
+    answered = [*prior_answers, *answers]
+    # Merged parallel results only exist once every sub-call finishes, so there is nothing to stream before 'done'.
+    if len(answers) >= PARALLEL_ANSWER_THRESHOLD:
+        yield done_event(get_refined_analysis(user_story, context, prior_answers, answers), answered)
+        return
+    analysis = yield from stream_ai_analysis(build_prompt(user_story, context, answered))
+    yield done_event(analysis, answered)
+
+# --- 6. Main App Route ---
 # MODIFIED: The logic is now more complex to handle the conversation loop.
+def read_form(form):
+    """Returns (user_story, context, prior_answers, answers); both are lists of (question, answer) pairs."""
+    # NEW: Pair answers with their questions; every question renders an answer field, so the lists line up.
+    questions, answers = form.getlist('question'), form.getlist('answer')
+    answered = [(q, a) for q, a in zip(questions, answers) if a]  # Only include non-empty answers
+    prior_answers = list(zip(form.getlist('prior_question'), form.getlist('prior_answer')))
+    return form['user_story'], form['context'], prior_answers, answered
+
+def build_answers_text(answers):
+    answers_text = "".join(f"\n\nQuestion: {question}\nAnswer: {answer}" for question, answer in answers)
+    return "\n\n--- User's Answers to Previous Questions ---" + answers_text
+
+def build_prompt(user_story, context, answers):
+    prompt = f"User Story: {user_story}\n\nContext/Brain Dump:\n{context}"
+    if answers:
+        prompt += build_answers_text(answers)
+    return prompt
+
+def build_result(analysis):
+    # NEW: The draft stays raw text; the browser formats it.
+    if "error" in analysis:
+        return {"ticket_draft": "", "error": analysis["error"], "clarifying_questions": []}
+    return {
+        "ticket_draft": analysis.get("ticket_draft", ""),
+        "error": None,
+        "clarifying_questions": analysis.get("clarifying_questions", []),
+    }
+
+# NEW: The empty form never changes, so it is rendered and gzipped once at startup.
+EMPTY_PAGE = render_page(user_story="", context="", ticket_draft="", error=None, questions_html="", api_key_error=None).encode()
+EMPTY_PAGE_GZIP = gzip.compress(EMPTY_PAGE, 9)
+
+def empty_page_response():
+    if request.accept_encodings['gzip'] > 0:  # 'in' would also match gzip;q=0
+        response = Response(EMPTY_PAGE_GZIP, mimetype='text/html', headers={'Content-Encoding': 'gzip'})
+    else:
+        response = Response(EMPTY_PAGE, mimetype='text/html')
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
-    if not model: return render_template_string(HTML_TEMPLATE, api_key_error="ERROR: GOOGLE_API_KEY is not set.")
+    if not models: return render_page(api_key_error="ERROR: GOOGLE_API_KEY is not set.")
+    if request.method == 'GET': return empty_page_response()
 
     # Initialize variables
     view_data = {
-        "user_story": "", "context": "", "preview_html": "",
-        "clarifying_questions": [], "api_key_error": None
+        "user_story": "", "context": "", "ticket_draft": "", "error": None,
+        "questions_html": "", "api_key_error": None
     }
 
     if request.method == 'POST':
-        user_story = request.form['user_story']
-        context = request.form['context']
-        
-        # Build the prompt for the AI
-        prompt = f"User Story: {user_story}\n\nContext/Brain Dump:\n{context}"
-        
-        # NEW: Check for and append answers to previous questions
-        answers_text = ""
-        i = 0
-        while f"question_{i}" in request.form:
-            question = request.form[f"question_{i}"]
-            answer = request.form[f"answer_{i}"]
-            if answer: # Only include non-empty answers
-                answers_text += f"\n\nQuestion: {question}\nAnswer: {answer}"
-            i += 1
-        
-        if answers_text:
-            prompt += "\n\n--- User's Answers to Previous Questions ---" + answers_text
+        user_story, context, prior_answers, answers = read_form(request.form)
 
         # Get analysis from the AI model
-        analysis = get_ai_analysis(prompt)
-        
-        if "error" in analysis:
-            view_data["preview_html"] = f"<p class='error'>Error: {analysis['error']}</p>"
-        else:
-            ticket_draft_md = analysis.get("ticket_draft", "")
-            # NEW: Convert markdown to HTML before sending to template
-            view_data["preview_html"] = markdown.markdown(ticket_draft_md)
-            view_data["clarifying_questions"] = analysis.get("clarifying_questions", [])
+        result = build_result(get_refined_analysis(user_story, context, prior_answers, answers))
+        view_data["ticket_draft"] = result["ticket_draft"]
+        view_data["error"] = result["error"]
+        view_data["questions_html"] = render_questions(result["clarifying_questions"], [*prior_answers, *answers])
 
         view_data["user_story"] = user_story
         view_data["context"] = context
         
-    return render_template_string(HTML_TEMPLATE, **view_data)
+    return render_page(**view_data)
+
+# NEW: Same conversation step as index(), streamed to the browser as Server-Sent Events.
+@app.route('/stream', methods=['POST'])
+def stream():
+    if not models: return {"error": "GOOGLE_API_KEY is not set."}, 503
+    return Response(
+        stream_with_context(stream_refined_analysis(*read_form(request.form))),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
-# --- 6. Run the App ---
+# --- 7. Run the App ---
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # The debug reloader polls the source tree; opt in with FLASK_DEBUG=1 for local development only.
+    app.run(debug=os.environ.get("FLASK_DEBUG") == "1")
\ No newline at end of file
@@ -0,0 +1,10 @@
+# Production server settings: gunicorn -c gunicorn.conf.py app:app
+import os
+import multiprocessing
+
+# gevent workers yield on the Gemini socket wait, so each one holds many in-flight requests.
+worker_class = "gevent"
+# cpu_count() reports the host's CPUs inside containers and dynos, so prefer the platform's WEB_CONCURRENCY.
+workers = int(os.environ.get("WEB_CONCURRENCY") or multiprocessing.cpu_count())
+worker_connections = 1000
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
@@ -0,0 +1,78 @@
+import orjson
+import pytest
+
+import app
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Answers each prompt from a callable; records prompts so tests can inspect the calls."""
+    def __init__(self, answer):
+        self.answer = answer
+        self.prompts = []
+
+    def generate_content(self, prompt, stream=False):
+        self.prompts.append(prompt)
+        return FakeResponse(orjson.dumps(self.answer(prompt)).decode())
+
+
+def draft(context, criteria):
+    return "User Story\nAs a PO, I want a ticket.\n\nContext\n" + context + "\n\nAcceptance Criteria\n" + criteria
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    def use(answer):
+        model = FakeModel(answer)
+        monkeypatch.setattr(app, "models", {app.FLASH_MODEL_NAME: model, app.PRO_MODEL_NAME: model})
+        monkeypatch.setattr(app, "analysis_cache", app.LRUCache(maxsize=256))
+        return model
+    return use
+
+
+def test_merge_keeps_context_from_every_draft():
+    analyses = [
+        {"ticket_draft": draft("Export runs nightly.", "- Export is a CSV"), "clarifying_questions": ["Q2?", "Q9?"]},
+        {"ticket_draft": draft("Export runs nightly.\nOnly admins can export.", "- Admins only"), "clarifying_questions": []},
+    ]
+    merged = app.merge_analyses(analyses, ["Q2?"])
+    sections = app.split_sections(merged["ticket_draft"])
+    assert sections["Context"] == ["Export runs nightly.", "Only admins can export."]
+    assert sections["Acceptance Criteria"] == ["- Export is a CSV", "- Admins only"]
+    assert merged["clarifying_questions"] == ["Q9?"]
+
+
+def test_parallel_turn_is_consolidated_by_one_call(fake_model):
+    def answer(prompt):
+        if "--- Drafts to Consolidate ---" in prompt:
+            return {"ticket_draft": draft("Consolidated.", "- All"), "clarifying_questions": ["Q1"], "open_questions": []}
+        return {"ticket_draft": draft("Partial.", "- One"), "clarifying_questions": [], "open_questions": []}
+    model = fake_model(answer)
+    answers = [(f"Q{i}", f"A{i}") for i in range(1, app.PARALLEL_ANSWER_THRESHOLD + 1)]
+
+    analysis = app.get_refined_analysis("story", "context", [], answers)
+
+    assert len(model.prompts) == len(answers) + 1
+    assert all(f"Answer: A{i}" in model.prompts[-1] for i in range(1, len(answers) + 1))
+    assert app.split_sections(analysis["ticket_draft"])["Context"] == ["Consolidated."]
+    assert analysis["clarifying_questions"] == []  # Q1 was answered in this turn.
+
+
+def test_parallel_turn_falls_back_to_merge_when_consolidation_fails(fake_model):
+    def answer(prompt):
+        if "--- Drafts to Consolidate ---" in prompt:
+            raise RuntimeError("quota exceeded")
+        last_answer = prompt.rsplit("Answer: ", 1)[1]
+        return {"ticket_draft": draft(f"Fact {last_answer}.", f"- {last_answer}"), "clarifying_questions": []}
+    fake_model(answer)
+    answers = [(f"Q{i}", f"A{i}") for i in range(1, app.PARALLEL_ANSWER_THRESHOLD + 1)]
+
+    analysis = app.get_refined_analysis("story", "context", [], answers)
+
+    sections = app.split_sections(analysis["ticket_draft"])
+    assert sections["Context"] == [f"Fact A{i}." for i in range(1, len(answers) + 1)]
+    assert sections["Acceptance Criteria"] == [f"- A{i}" for i in range(1, len(answers) + 1)]